@@ -1,83 +1,517 @@
 from __future__ import annotations
-import argparse
-import json
+import contextlib
+import functools
 import os
-from dataclasses import dataclass
+import sys
+import threading
+import time
+from dataclasses import dataclass, fields
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional
-from urllib import error, request
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+# argparse and the HTTP stack are imported where they are used, so the GUI (which never
+# parses argv) and status checks (which never hit the network) don't pay for them at startup.
+if TYPE_CHECKING:
+    import argparse
+    import http.client
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the json module below is used otherwise
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import ujson as json  # drop-in replacement, faster than stdlib json
+except ImportError:
+    import json
+
+# ujson output is already compact; the stdlib needs separators to drop the spaces it adds.
+_COMPACT_JSON: Dict[str, Any] = {"separators": (",", ":")} if json.__name__ == "json" else {}
+# Slotted dataclasses (no per-instance __dict__) need Python 3.10+; older versions use plain ones.
+_DATACLASS_SLOTS: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
 
 STATE_FILE = Path(".notion_timer_state.json")
 NOTION_VERSION = "2022-06-28"
 
-
-@dataclass
+# STATE_FILE is kept at this size (JSON padded with spaces) so it can be rewritten in place.
+_STATE_FILE_SIZE = 512
+
+# Parsed STATE_FILE contents, the (st_ino, st_mtime_ns) they were read at and when they were
+# read (time.time_ns()). The file stays 512 bytes, so st_size can't tell writes apart.
+_state_cache: Tuple[Tuple[int, int], int, Optional[Dict[str, Any]]] = ((-1, -1), 0, None)
+# Timestamp granularity to allow for: a file whose mtime is this much older than our read
+# can't have been rewritten without its mtime changing. Anything newer is re-read and its
+# "gen" (bumped on every save) compared with the cached one.
+_MTIME_SLACK_NS = 2_000_000_000
+
+# Advisory lock files shared by the CLI and the GUI (and the GUI's worker threads). The first
+# guards each read-modify-write of STATE_FILE; the second is held for a whole flush so the
+# same pending entry is never sent twice.
+_STATE_LOCK_FILE = STATE_FILE.with_suffix(".lock")
+_FLUSH_LOCK_FILE = STATE_FILE.with_suffix(".flush.lock")
+
+# Page payload with the variable values spliced in as JSON literals. Used when orjson is
+# unavailable: formatting this is ~3x faster than building the dict and running json.dumps.
+_PAGE_TEMPLATE = (
+    '{"parent":{"database_id":%s},"properties":{'
+    '"Task":{"title":[{"text":{"content":%s}}]},'
+    '"Project":{"select":{"name":%s}},'
+    '"Start":{"date":{"start":%s}},'
+    '"End":{"date":{"start":%s}},'
+    '"Duration (minutes)":{"number":%s}}}'
+)
+
+# Fragments of Notion validation messages that point at the database setup (a renamed or
+# retyped property) rather than at the values of one entry.
+_CONFIG_ERROR_HINTS = ("is not a property that exists", "is expected to be", "Could not find")
+
+# Kept-alive connection to Notion, reused across requests to skip repeated TCP/TLS handshakes.
+_conn: Optional[http.client.HTTPSConnection] = None
+_CONN_LOCK = threading.Lock()
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class SessionState:
     project: str
     task: str
     start: str  # ISO timestamp
+    start_epoch: Optional[float] = None  # time.time() at start; absent in older state files
+
+    @classmethod
+    def from_list(cls, data: List[Any]) -> "SessionState":
+        return cls(*data)
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "SessionState":
-        return cls(project=data["project"], task=data["task"], start=data["start"])
+        """Read the object form used by older state files."""
+        return cls(
+            project=data["project"],
+            task=data["task"],
+            start=data["start"],
+            start_epoch=data.get("start_epoch"),
+        )
 
-    def to_dict(self) -> Dict[str, Any]:
-        return {"project": self.project, "task": self.task, "start": self.start}
+    def to_list(self) -> List[Any]:
+        return [self.project, self.task, self.start, self.start_epoch]
 
+    def elapsed_minutes(self) -> float:
+        if self.start_epoch is None:
+            return (datetime.now(tz=timezone.utc) - _parse_iso(self.start)).total_seconds() / 60
+        return (time.time() - self.start_epoch) / 60
 
-def _read_state() -> Optional[SessionState]:
-    if not STATE_FILE.exists():
-        return None
+
+@dataclass(**_DATACLASS_SLOTS)
+class CompletedEntry:
+    project: str
+    task: str
+    start: str  # ISO timestamp
+    end: str  # ISO timestamp
+    duration_minutes: float
+
+    @classmethod
+    def from_list(cls, data: List[Any]) -> "CompletedEntry":
+        return cls(*data)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CompletedEntry":
+        """Read the object form used by older state files."""
+        return cls(
+            project=data["project"],
+            task=data["task"],
+            start=data["start"],
+            end=data["end"],
+            duration_minutes=data["duration_minutes"],
+        )
+
+    def to_list(self) -> List[Any]:
+        return [self.project, self.task, self.start, self.end, self.duration_minutes]
+
+
+class NotionAPIError(SystemExit):
+    """Notion answered with an HTTP error status.
+
+    ``code`` and ``detail`` are the ``code``/``message`` fields of Notion's error body,
+    empty if it couldn't be parsed.
+    """
+
+    def __init__(self, status: int, message: str, code: str = "", detail: str = "") -> None:
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.detail = detail
+
+    @property
+    def entry_specific(self) -> bool:
+        """Whether only the entry being written is at fault (e.g. a comma in a select name).
+
+        Auth, permission and not-found errors, and validation errors about the database's
+        properties, hit every entry and go away once the user fixes the setup.
+        """
+        return (
+            self.status == 400
+            and self.code == "validation_error"
+            and not any(hint in self.detail for hint in _CONFIG_ERROR_HINTS)
+        )
+
+
+@contextlib.contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive advisory lock on ``path``, blocking other processes and threads."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
     try:
-        data = json.loads(STATE_FILE.read_text())
-        return SessionState.from_dict(data)
-    except Exception:
+        if os.name == "nt":
+            import msvcrt
+
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10 s; a flush can take longer
+                    continue
+            try:
+                yield
+            finally:
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(fd, fcntl.LOCK_EX)  # released when fd is closed
+            yield
+    finally:
+        os.close(fd)
+
+
+def _empty_store() -> Dict[str, Any]:
+    return {"gen": 0, "active": None, "pending": [], "failed": []}
+
+
+def _malformed_state(detail: str) -> SystemExit:
+    return SystemExit(
+        f"{STATE_FILE} is malformed: {detail}. Fix or delete it"
+        " (deleting it also discards any entries not yet written to Notion)."
+    )
+
+
+def _record_from_json(cls: Any, item: Any, where: str) -> List[Any]:
+    """Check one stored record for ``cls`` and return it in array form."""
+    if isinstance(item, dict):  # older versions stored each record as an object
+        try:
+            return cls.from_dict(item).to_list()
+        except KeyError as exc:
+            raise _malformed_state(f"{where} is missing {exc}")
+    size = len(fields(cls))
+    if not isinstance(item, list) or len(item) != size:
+        raise _malformed_state(f"{where} should be a list of {size} values, got {item!r}")
+    return item
+
+
+def _store_from_json(data: Any) -> Dict[str, Any]:
+    """Validate parsed STATE_FILE contents and normalise them into a store."""
+    if not isinstance(data, dict):
+        raise _malformed_state("expected a JSON object")
+    if "project" in data:  # single-session file written by older versions
+        data = {"active": data}
+    store = _empty_store()
+    gen = data.get("gen", 0)
+    if not isinstance(gen, int):
+        raise _malformed_state("'gen' should be an integer")
+    store["gen"] = gen
+    if data.get("active") is not None:
+        store["active"] = _record_from_json(SessionState, data["active"], "'active'")
+    for name in ("pending", "failed"):
+        records = data.get(name) or []
+        if not isinstance(records, list):
+            raise _malformed_state(f"'{name}' should be a list")
+        store[name] = [
+            _record_from_json(CompletedEntry, item, f"'{name}' entry {i}")
+            for i, item in enumerate(records)
+        ]
+    return store
+
+
+def _load_store(fresh: bool = False) -> Dict[str, Any]:
+    """Return the state file as ``{"gen": int, "active": list | None, "pending": [...], ...}``.
+
+    ``pending`` holds entries still to be written to Notion, ``failed`` those Notion
+    rejected, and ``gen`` counts saves. Records are stored as arrays in dataclass field
+    order, which is cheaper to encode and decode than one object per record.
+
+    ``fresh`` skips the cache and the locking; read-modify-write cycles pass it while
+    already holding the state lock, so another process's recent write is never overwritten.
+    """
+    global _state_cache
+    if fresh:
+        store = _read_store_file()
+    else:
+        try:
+            st = STATE_FILE.stat()
+        except FileNotFoundError:
+            return _empty_store()
+        key = (st.st_ino, st.st_mtime_ns)
+        cached_key, loaded_ns, store = _state_cache
+        if store is None or key != cached_key or st.st_mtime_ns + _MTIME_SLACK_NS >= loaded_ns:
+            loaded_ns = time.time_ns()
+            # In-place writes aren't atomic for readers, so read under the writers' lock.
+            with _file_lock(_STATE_LOCK_FILE):
+                fresh_store = _read_store_file()
+            if store is None or fresh_store["gen"] != store["gen"] or key != cached_key:
+                store = fresh_store
+            _state_cache = (key, loaded_ns, store)
+    # Callers mutate the returned store, so hand out a copy of the mutable parts.
+    return {
+        "gen": store["gen"],
+        "active": store["active"],
+        "pending": list(store["pending"]),
+        "failed": list(store["failed"]),
+    }
+
+
+def _read_store_file() -> Dict[str, Any]:
+    try:
+        raw = STATE_FILE.read_bytes()
+    except FileNotFoundError:
+        return _empty_store()
+    try:
+        data = orjson.loads(raw) if orjson else json.loads(raw.decode("utf-8"))
+    except ValueError as exc:  # also covers UnicodeDecodeError
+        raise _malformed_state(f"not valid JSON ({exc})") from None
+    return _store_from_json(data)
+
+
+def _save_store(store: Dict[str, Any]) -> None:
+    """Write ``store`` (as returned by ``_load_store``) back, bumping its generation."""
+    global _state_cache
+    _state_cache = ((-1, -1), 0, None)
+    store = {**store, "gen": store["gen"] + 1}
+    if orjson:
+        body = orjson.dumps(store)
+    else:
+        body = json.dumps(store, ensure_ascii=False, **_COMPACT_JSON).encode("utf-8")
+    in_place = not store["pending"] and not store["failed"]
+    if in_place and len(body) <= _STATE_FILE_SIZE and hasattr(os, "pwrite"):
+        # Overwrite the preallocated file in place: a single pwrite, no truncate or new inode.
+        # The JSON parsers skip the trailing space padding. Unlike the rename below this is
+        # not atomic for a concurrent reader, which is why _load_store reads under the lock,
+        # and why it is only used when there are no queued entries a torn write could lose.
+        try:
+            fd = os.open(STATE_FILE, os.O_WRONLY)
+        except FileNotFoundError:
+            pass
+        else:
+            try:
+                if os.fstat(fd).st_size == _STATE_FILE_SIZE:
+                    os.pwrite(fd, body.ljust(_STATE_FILE_SIZE), 0)
+                    return
+            finally:
+                os.close(fd)
+    # First write, queued entries, or no pwrite (Windows): write a padded copy and rename it
+    # over the state file.
+    tmp = STATE_FILE.with_suffix(".tmp")
+    tmp.write_bytes(body.ljust(_STATE_FILE_SIZE))
+    os.replace(tmp, STATE_FILE)
+
+
+def _read_state() -> Optional[SessionState]:
+    active = _load_store()["active"]
+    if active is None:
         return None
+    return SessionState.from_list(active)
 
 
-def _write_state(state: SessionState) -> None:
-    STATE_FILE.write_text(json.dumps(state.to_dict(), ensure_ascii=False, indent=2))
+def _write_state(state: SessionState) -> bool:
+    """Make ``state`` the active session; returns False if one is already running."""
+    with _file_lock(_STATE_LOCK_FILE):
+        store = _load_store(fresh=True)
+        if store["active"] is not None:  # e.g. started from the CLI and the GUI at once
+            return False
+        store["active"] = state.to_list()
+        _save_store(store)
+        return True
 
 
 def _clear_state() -> None:
-    if STATE_FILE.exists():
-        STATE_FILE.unlink()
+    with _file_lock(_STATE_LOCK_FILE):
+        store = _load_store(fresh=True)
+        store["active"] = None
+        _save_store(store)
+
+
+def _read_pending(fresh: bool = False) -> List[CompletedEntry]:
+    return [CompletedEntry.from_list(item) for item in _load_store(fresh)["pending"]]
+
+
+def _read_failed() -> List[CompletedEntry]:
+    return [CompletedEntry.from_list(item) for item in _load_store()["failed"]]
+
+
+def _queue_entry(state: SessionState, entry: CompletedEntry) -> bool:
+    """Close the active session ``state`` and queue its entry for writing to Notion.
+
+    Returns False, queueing nothing, if ``state`` is no longer the active session because
+    another process stopped it first.
+    """
+    with _file_lock(_STATE_LOCK_FILE):
+        store = _load_store(fresh=True)
+        if store["active"] != state.to_list():
+            return False
+        store["active"] = None
+        store["pending"].append(entry.to_list())
+        _save_store(store)
+        return True
+
+
+def _requeue_failed() -> int:
+    """Move every entry from the ``failed`` list back into the queue; returns how many."""
+    with _file_lock(_STATE_LOCK_FILE):
+        store = _load_store(fresh=True)
+        failed = store["failed"]
+        if failed:
+            store["pending"].extend(failed)
+            store["failed"] = []
+            _save_store(store)
+        return len(failed)
+
+
+def _drop_pending(entry: CompletedEntry, failed: bool = False) -> None:
+    """Remove ``entry`` from the queue, moving it to the ``failed`` list if ``failed``."""
+    with _file_lock(_STATE_LOCK_FILE):
+        store = _load_store(fresh=True)
+        target = entry.to_list()
+        if target in store["pending"]:
+            store["pending"].remove(target)
+            if failed:
+                store["failed"].append(target)
+            _save_store(store)
+
+
+# Resolved once: the offset the machine was on at startup. Timestamps stay correct instants
+# even if a long-running GUI crosses a DST change; only the displayed offset would lag.
+_LOCAL_TZ = datetime.now(tz=timezone.utc).astimezone().tzinfo
 
 
 def _iso_now() -> str:
-    return datetime.now(tz=timezone.utc).astimezone().isoformat()
+    # Notion date properties ignore sub-second precision.
+    return datetime.now(tz=_LOCAL_TZ).isoformat(timespec="seconds")
 
 
 def _parse_iso(dt: str) -> datetime:
     return datetime.fromisoformat(dt)
 
 
+@functools.lru_cache(maxsize=None)
+def _env(name: str) -> Optional[str]:
+    return os.environ.get(name)
+
+
 def _ensure_env(value: Optional[str], name: str) -> str:
     if value:
         return value
-    env_val = os.getenv(name)
+    env_val = _env(name)
     if not env_val:
         raise SystemExit(f"Missing required {name}. Provide it via environment variable or CLI flag.")
     return env_val
 
 
-def _post_json(url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> None:
-    body = json.dumps(payload).encode("utf-8")
-    req = request.Request(url, data=body, headers=headers, method="POST")
+def _open_connection(host: str) -> http.client.HTTPSConnection:
+    """Open an HTTPS connection to ``host``, tunnelling through HTTPS_PROXY like urllib does."""
+    import http.client
+    from urllib import parse, request
+
+    proxy = request.getproxies().get("https")
+    if proxy and not request.proxy_bypass(host):
+        proxy_url = parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+        default_port = 443 if proxy_url.scheme == "https" else 80
+        conn = http.client.HTTPSConnection(
+            proxy_url.hostname or "", proxy_url.port or default_port, timeout=30
+        )
+        tunnel_headers = {}
+        if proxy_url.username is not None:
+            import base64
+
+            credentials = (
+                f"{parse.unquote(proxy_url.username)}:{parse.unquote(proxy_url.password or '')}"
+            )
+            tunnel_headers["Proxy-Authorization"] = "Basic " + base64.b64encode(
+                credentials.encode("utf-8")
+            ).decode("ascii")
+        conn.set_tunnel(host, headers=tunnel_headers)
+        return conn
+    return http.client.HTTPSConnection(host, timeout=30)
+
+
+def _connection_dropped(conn: http.client.HTTPSConnection) -> bool:
+    """Whether the server has closed an idle kept-alive connection.
+
+    An idle socket should have nothing to read; if select() says it is readable, it is at
+    EOF (or holds data nobody asked for) and must not be reused.
+    """
+    import select
+
+    if conn.sock is None:
+        return False
     try:
-        with request.urlopen(req, timeout=30) as resp:
-            status = resp.getcode()
-            text = resp.read().decode("utf-8")
-    except error.HTTPError as exc:  # type: ignore[assignment]
-        status = exc.code
-        text = exc.read().decode("utf-8")
-    except error.URLError as exc:  # type: ignore[assignment]
-        raise SystemExit(f"Network error calling Notion: {exc}")
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def _post_json(url: str, headers: Dict[str, str], body: bytes) -> None:
+    global _conn
+    import http.client
+    from urllib import parse
+
+    parts = parse.urlsplit(url)
+    with _CONN_LOCK:
+        if _conn is not None and _connection_dropped(_conn):
+            _conn.close()
+            _conn = None
+        for _ in range(2):
+            reused = _conn is not None
+            if _conn is None:
+                _conn = _open_connection(parts.netloc)
+            try:
+                _conn.request("POST", parts.path, body=body, headers=headers)
+            except (OSError, http.client.HTTPException) as exc:
+                _conn.close()
+                _conn = None
+                if reused and isinstance(exc, (ConnectionResetError, BrokenPipeError)):
+                    continue  # the kept-alive socket died while sending; retry on a fresh one
+                raise SystemExit(f"Network error calling Notion: {exc}")
+            try:
+                # No retry from here on: the request went out and Notion may have created
+                # the page, so re-sending could duplicate it.
+                resp = _conn.getresponse()
+                status = resp.status
+                text = ""
+                if status >= 400:
+                    # Notion's error JSON is small; cap the read in case something else answers.
+                    text = resp.read(8192).decode("utf-8", errors="replace")
+                    if not resp.isclosed():
+                        _conn.close()
+                        _conn = None
+                else:
+                    resp.read()  # drained undecoded so the connection can be reused
+                break
+            except (OSError, http.client.HTTPException) as exc:
+                _conn.close()
+                _conn = None
+                raise SystemExit(f"Network error calling Notion: {exc}")
 
     if status >= 400:
-        raise SystemExit(
-            f"Notion API error {status}: {text}. Verify database permissions and property names."
+        try:
+            error_body = json.loads(text)
+        except ValueError:
+            error_body = None
+        if not isinstance(error_body, dict):
+            error_body = {}
+        raise NotionAPIError(
+            status,
+            f"Notion API error {status}: {text}. Verify database permissions and property names.",
+            code=str(error_body.get("code", "")),
+            detail=str(error_body.get("message", "")),
         )
 
 
@@ -96,17 +530,72 @@ def create_notion_page(
         "Notion-Version": NOTION_VERSION,
         "Content-Type": "application/json",
     }
-    payload: Dict[str, Any] = {
-        "parent": {"database_id": database_id},
-        "properties": {
-            "Task": {"title": [{"text": {"content": task}}]},
-            "Project": {"select": {"name": project}},
-            "Start": {"date": {"start": start_iso}},
-            "End": {"date": {"start": end_iso}},
-            "Duration (minutes)": {"number": round(duration_minutes, 2)},
-        },
-    }
-    _post_json(url, headers, payload)
+    if orjson:
+        # orjson encodes the literal faster than the template can be filled.
+        body = orjson.dumps(
+            {
+                "parent": {"database_id": database_id},
+                "properties": {
+                    "Task": {"title": [{"text": {"content": task}}]},
+                    "Project": {"select": {"name": project}},
+                    "Start": {"date": {"start": start_iso}},
+                    "End": {"date": {"start": end_iso}},
+                    "Duration (minutes)": {"number": round(duration_minutes, 2)},
+                },
+            }
+        )
+    else:
+        dumps = json.dumps
+        body = (
+            _PAGE_TEMPLATE
+            % (
+                dumps(database_id),
+                dumps(task),
+                dumps(project),
+                dumps(start_iso),
+                dumps(end_iso),
+                dumps(round(duration_minutes, 2)),
+            )
+        ).encode("utf-8")
+    _post_json(url, headers, body)
+
+
+def _flush_pending(
+    token: str, database_id: str
+) -> Tuple[int, List[Tuple[CompletedEntry, NotionAPIError]]]:
+    """Write every queued entry to Notion over the shared keep-alive connection.
+
+    Entries are removed from the queue one by one as Notion accepts them. An entry Notion
+    rejects because of its own values (see NotionAPIError.entry_specific) is moved to the
+    ``failed`` list so it can't block the queue. Any other error (network, auth, a missing
+    database or property, rate limiting, 5xx) stops the flush and leaves the remainder
+    queued for the next call. Returns the number of entries written and the rejected ones.
+    """
+    with _file_lock(_FLUSH_LOCK_FILE):
+        written = 0
+        rejected: List[Tuple[CompletedEntry, NotionAPIError]] = []
+        with _file_lock(_STATE_LOCK_FILE):
+            pending = _read_pending(fresh=True)
+        for entry in pending:
+            try:
+                create_notion_page(
+                    token=token,
+                    database_id=database_id,
+                    project=entry.project,
+                    task=entry.task,
+                    start_iso=entry.start,
+                    end_iso=entry.end,
+                    duration_minutes=entry.duration_minutes,
+                )
+            except NotionAPIError as exc:
+                if not exc.entry_specific:
+                    raise
+                _drop_pending(entry, failed=True)
+                rejected.append((entry, exc))
+                continue
+            _drop_pending(entry)
+            written += 1
+        return written, rejected
 
 
 def start_session(args: argparse.Namespace) -> None:
@@ -114,50 +603,80 @@ def start_session(args: argparse.Namespace) -> None:
         raise SystemExit("A session is already running. Use 'stop' before starting a new one.")
 
     start_time = _iso_now()
-    state = SessionState(project=args.project, task=args.task, start=start_time)
-    _write_state(state)
+    state = SessionState(
+        project=args.project, task=args.task, start=start_time, start_epoch=time.time()
+    )
+    if not _write_state(state):
+        raise SystemExit("A session is already running. Use 'stop' before starting a new one.")
     print(f"Started '{state.project}' / '{state.task}' at {state.start}")
 
 
 def stop_session(args: argparse.Namespace) -> None:
+    if args.retry_failed:
+        requeued = _requeue_failed()
+        if requeued:
+            print(f"Re-queued {requeued} previously rejected entry(ies).")
+
     state = _read_state()
-    if state is None:
+    if state is None and not _read_pending():
         raise SystemExit("No active session found. Use 'start' first.")
 
     token = _ensure_env(args.token, "NOTION_TOKEN")
     database_id = _ensure_env(args.database_id, "NOTION_DATABASE_ID")
-    end_time = _iso_now()
-
-    start_dt = _parse_iso(state.start)
-    end_dt = _parse_iso(end_time)
-    duration_minutes = (end_dt - start_dt).total_seconds() / 60
-
-    create_notion_page(
-        token=token,
-        database_id=database_id,
-        project=state.project,
-        task=state.task,
-        start_iso=state.start,
-        end_iso=end_time,
-        duration_minutes=duration_minutes,
-    )
 
-    _clear_state()
-    print(
-        f"Recorded '{state.project}' / '{state.task}' for {duration_minutes:.2f} minutes."
-        " Entry stored in Notion."
-    )
+    if state is not None:
+        end_time = _iso_now()
+        duration_minutes = state.elapsed_minutes()
+        entry = CompletedEntry(
+            project=state.project,
+            task=state.task,
+            start=state.start,
+            end=end_time,
+            duration_minutes=duration_minutes,
+        )
+        if _queue_entry(state, entry):
+            print(
+                f"Stopped '{state.project}' / '{state.task}' after {duration_minutes:.2f} minutes."
+            )
+        else:
+            print(f"'{state.project}' / '{state.task}' was already stopped elsewhere.")
+
+    try:
+        written, rejected = _flush_pending(token, database_id)
+    except SystemExit as exc:
+        raise SystemExit(
+            f"{exc}\n{len(_read_pending())} entry(ies) kept in {STATE_FILE.name};"
+            " run 'stop' again to retry."
+        )
+    print(f"Stored {written} entry(ies) in Notion.")
+    if rejected:
+        details = "\n".join(f"'{e.project}' / '{e.task}': {exc}" for e, exc in rejected)
+        raise SystemExit(
+            f"Notion rejected {len(rejected)} entry(ies) and they were moved to 'failed' in"
+            f" {STATE_FILE.name}:\n{details}\nAfter fixing them, run 'stop --retry-failed'."
+        )
 
 
 def status_session(_: argparse.Namespace) -> None:
     state = _read_state()
+    pending = _read_pending()
+    failed = _read_failed()
     if state is None:
         print("No active session.")
-        return
-    print(f"Running: project='{state.project}', task='{state.task}', started at {state.start}")
+    else:
+        print(f"Running: project='{state.project}', task='{state.task}', started at {state.start}")
+    if pending:
+        print(f"{len(pending)} entry(ies) waiting to be written to Notion; run 'stop' to retry.")
+    if failed:
+        print(
+            f"{len(failed)} entry(ies) rejected by Notion are kept under 'failed' in"
+            f" {STATE_FILE.name}; run 'stop --retry-failed' to send them again."
+        )
 
 
 def build_parser() -> argparse.ArgumentParser:
+    import argparse
+
     parser = argparse.ArgumentParser(
         description=(
             "Minimal Notion-backed timer. Start a session, then stop it to send the elapsed "
@@ -184,6 +703,11 @@ def build_parser() -> argparse.ArgumentParser:
     start_parser.set_defaults(func=start_session)
 
     stop_parser = subparsers.add_parser("stop", help="Stop the timer and write to Notion")
+    stop_parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Also re-send entries Notion rejected earlier (listed under 'failed' by status)",
+    )
     stop_parser.set_defaults(func=stop_session)
 
     status_parser = subparsers.add_parser("status", help="Show the current timer state")
@@ -192,9 +716,50 @@ def build_parser() -> argparse.ArgumentParser:
     return parser
 
 
+def _parse_args_fast(argv: list[str]) -> Optional[SimpleNamespace]:
+    """Parse well-formed invocations without importing argparse.
+
+    Returns None for anything else (``--help``, unknown options, wrong argument counts)
+    so that build_parser() can produce the usual help and error messages.
+    """
+    options: Dict[str, Optional[str]] = {"token": None, "database_id": None}
+    retry_failed = False
+    positionals: list[str] = []
+    args = iter(argv)
+    for arg in args:
+        name, sep, value = arg.partition("=")
+        if name in ("--token", "--database-id"):
+            if not sep:
+                next_arg = next(args, None)
+                if next_arg is None:
+                    return None
+                value = next_arg
+            options[name[2:].replace("-", "_")] = value
+        elif arg == "--retry-failed":
+            retry_failed = True
+        elif arg.startswith("-"):
+            return None
+        else:
+            positionals.append(arg)
+
+    command, rest = (positionals[0], positionals[1:]) if positionals else ("status", [])
+    if command == "stop" and not rest:
+        return SimpleNamespace(**options, retry_failed=retry_failed, func=stop_session)
+    if retry_failed:  # only valid for stop
+        return None
+    if command == "start" and len(rest) == 2:
+        return SimpleNamespace(**options, project=rest[0], task=rest[1], func=start_session)
+    if command == "status" and not rest:
+        return SimpleNamespace(**options, func=status_session)
+    return None
+
+
 def main(argv: Optional[list[str]] = None) -> None:
-    parser = build_parser()
-    args = parser.parse_args(argv)
+    if argv is None:
+        argv = sys.argv[1:]
+    args = _parse_args_fast(argv)
+    if args is None:
+        args = build_parser().parse_args(argv)
     args.func(args)
 
 
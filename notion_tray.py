@@ -8,19 +8,25 @@ database ID.
 """
 from __future__ import annotations
 
+import concurrent.futures
+import time
 import tkinter as tk
-from tkinter import messagebox
+from typing import List, Optional, Tuple
 
 from notion_timer import (
     STATE_FILE,
+    CompletedEntry,
+    NotionAPIError,
     SessionState,
-    _clear_state,
     _ensure_env,
+    _env,
+    _flush_pending,
     _iso_now,
-    _parse_iso,
+    _queue_entry,
+    _read_failed,
+    _read_pending,
     _read_state,
     _write_state,
-    create_notion_page,
 )
 
 
@@ -33,10 +39,20 @@ class TimerApp:
         self.project_var = tk.StringVar()
         self.task_var = tk.StringVar()
         self.status_var = tk.StringVar()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+        # Read the Notion settings once up front so stop_timer never hits the environment.
+        _env("NOTION_TOKEN")
+        _env("NOTION_DATABASE_ID")
 
         self._build_ui()
         self.refresh_status()
 
+        # Poll the (mtime-cached) state file so the elapsed time and changes made from the
+        # CLI show up without clicking "刷新状态".
+        self._tick_ms = 1000
+        self.root.after(self._tick_ms, self._tick)
+
     def _build_ui(self) -> None:
         padding = {"padx": 10, "pady": 6}
 
@@ -54,9 +70,10 @@ class TimerApp:
         tk.Button(button_frame, text="开始计时", command=self.start_timer, width=10).grid(
             row=0, column=0, padx=5
         )
-        tk.Button(button_frame, text="停止并写入Notion", command=self.stop_timer, width=18).grid(
-            row=0, column=1, padx=5
+        self.stop_button = tk.Button(
+            button_frame, text="停止并写入Notion", command=self.stop_timer, width=18
         )
+        self.stop_button.grid(row=0, column=1, padx=5)
         tk.Button(button_frame, text="刷新状态", command=self.refresh_status, width=10).grid(
             row=0, column=2, padx=5
         )
@@ -76,24 +93,48 @@ class TimerApp:
         )
 
     def start_timer(self) -> None:
+        from tkinter import messagebox
+
         project = self.project_var.get().strip()
         task = self.task_var.get().strip()
         if not project or not task:
             messagebox.showerror("缺少信息", "请输入项目和任务名称后再开始计时。")
             return
 
-        if _read_state() is not None:
+        try:
+            running = _read_state() is not None
+        except SystemExit as exc:  # malformed state file
+            messagebox.showerror("状态文件有误", str(exc))
+            return
+        if running:
             messagebox.showwarning("已有计时", "当前已有计时在运行，先停止再开始新计时。")
             return
 
         start_time = _iso_now()
-        _write_state(SessionState(project=project, task=task, start=start_time))
+        try:
+            started = _write_state(
+                SessionState(project=project, task=task, start=start_time, start_epoch=time.time())
+            )
+        except SystemExit as exc:  # malformed state file
+            messagebox.showerror("状态文件有误", str(exc))
+            return
+        if not started:  # started from the CLI in the meantime
+            self.refresh_status()
+            messagebox.showwarning("已有计时", "当前已有计时在运行，先停止再开始新计时。")
+            return
         self.status_var.set(f"进行中：{project} / {task}，起始 {start_time}")
         messagebox.showinfo("已开始", "计时已开始，完成后点击“停止并写入Notion”。")
 
     def stop_timer(self) -> None:
-        state = _read_state()
-        if state is None:
+        from tkinter import messagebox
+
+        try:
+            state = _read_state()
+            has_pending = bool(_read_pending())
+        except SystemExit as exc:  # malformed state file
+            messagebox.showerror("状态文件有误", str(exc))
+            return
+        if state is None and not has_pending:
             messagebox.showwarning("未在计时", "没有正在运行的计时，直接开始新的即可。")
             return
 
@@ -104,38 +145,92 @@ class TimerApp:
             messagebox.showerror("缺少配置", str(exc))
             return
 
-        end_time = _iso_now()
-        try:
-            start_dt = _parse_iso(state.start)
-            end_dt = _parse_iso(end_time)
-            duration_minutes = (end_dt - start_dt).total_seconds() / 60
-
-            create_notion_page(
-                token=token,
-                database_id=database_id,
+        entry: Optional[CompletedEntry] = None
+        if state is not None:
+            end_time = _iso_now()
+            duration_minutes = state.elapsed_minutes()
+            entry = CompletedEntry(
                 project=state.project,
                 task=state.task,
-                start_iso=state.start,
-                end_iso=end_time,
+                start=state.start,
+                end=end_time,
                 duration_minutes=duration_minutes,
             )
-        except Exception as exc:  # deliver context to the user
-            messagebox.showerror("写入失败", f"向 Notion 写入时出错：{exc}")
+            # Queued first so the entry survives a failed or interrupted write.
+            try:
+                if not _queue_entry(state, entry):
+                    entry = None  # already stopped from the CLI; just flush the queue
+            except SystemExit as exc:  # malformed state file
+                messagebox.showerror("状态文件有误", str(exc))
+                return
+
+        # The HTTP round trips run off the Tk thread so the window stays responsive;
+        # the result is marshalled back through root.after.
+        self.status_var.set("写入中...")
+        self.stop_button.config(state=tk.DISABLED)  # avoid double-submit while writing
+        fut = self._pool.submit(_flush_pending, token, database_id)
+        fut.add_done_callback(lambda f: self.root.after(0, self._on_write_done, f, entry))
+
+    def _on_write_done(
+        self,
+        fut: concurrent.futures.Future[Tuple[int, List[Tuple[CompletedEntry, NotionAPIError]]]],
+        entry: Optional[CompletedEntry],
+    ) -> None:
+        from tkinter import messagebox
+
+        self.stop_button.config(state=tk.NORMAL)
+        self.refresh_status()
+        try:
+            _, rejected = fut.result()
+        except (Exception, SystemExit) as exc:  # network, auth or setup errors; queue kept
+            messagebox.showerror(
+                "写入失败",
+                f"向 Notion 写入时出错：{exc}\n记录已保留，下次点击“停止并写入Notion”时会重试。",
+            )
+            return
+        if rejected:
+            details = "\n".join(f"{e.project} / {e.task}：{exc}" for e, exc in rejected)
+            messagebox.showerror(
+                "Notion 拒绝了记录",
+                f"以下记录被 Notion 拒绝，已移到 {STATE_FILE.name} 的 failed 列表：\n{details}\n"
+                "修正后可运行 python notion_timer.py stop --retry-failed 重新写入。",
+            )
+            if entry is not None and any(e == entry for e, _ in rejected):
+                return
+        if entry is None:
+            messagebox.showinfo("已记录", "队列中的记录已全部写入 Notion。")
             return
-
-        _clear_state()
-        self.status_var.set("空闲，无进行中的计时。")
         messagebox.showinfo(
             "已记录",
-            f"已记录 {state.project} / {state.task}，用时 {duration_minutes:.2f} 分钟。",
+            f"已记录 {entry.project} / {entry.task}，用时 {entry.duration_minutes:.2f} 分钟。",
         )
 
+    def _tick(self) -> None:
+        # Reschedule first so an error while refreshing can't stop the polling for good.
+        self.root.after(self._tick_ms, self._tick)
+        if str(self.stop_button["state"]) != tk.DISABLED:  # keep "写入中..." while writing
+            self.refresh_status()
+
     def refresh_status(self) -> None:
-        state = _read_state()
+        try:
+            state = _read_state()
+            pending = len(_read_pending())
+            failed = len(_read_failed())
+        except SystemExit as exc:  # malformed state file; shown instead of closing the window
+            self.status_var.set(str(exc))
+            return
+        suffix = f"（{pending} 条待写入）" if pending else ""
+        if failed:
+            suffix += f"（{failed} 条被拒绝）"
         if state is None:
-            self.status_var.set("空闲，无进行中的计时。")
+            self.status_var.set(f"空闲，无进行中的计时。{suffix}")
             return
-        self.status_var.set(f"进行中：{state.project} / {state.task}，起始 {state.start}")
+        minutes, seconds = divmod(int(state.elapsed_minutes() * 60), 60)
+        hours, minutes = divmod(minutes, 60)
+        self.status_var.set(
+            f"进行中：{state.project} / {state.task}，已用 {hours}:{minutes:02d}:{seconds:02d}"
+            f"（起始 {state.start}）{suffix}"
+        )
 
 
 def main() -> None:
@@ -0,0 +1,166 @@
+import json
+import os
+
+import pytest
+
+import notion_timer as nt
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    """Run each test against its own empty state file."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(nt, "_state_cache", ((-1, -1), 0, None))
+    return tmp_path
+
+
+def _entry(task: str) -> nt.CompletedEntry:
+    return nt.CompletedEntry(
+        "proj", task, "2024-01-01T09:00:00+00:00", "2024-01-01T10:00:00+00:00", 60.0
+    )
+
+
+def _queue(*tasks: str) -> None:
+    store = nt._empty_store()
+    store["pending"] = [_entry(task).to_list() for task in tasks]
+    nt._save_store(store)
+
+
+def _tasks(entries) -> list:
+    return [entry.task for entry in entries]
+
+
+def test_migrates_single_session_file():
+    legacy = {"project": "proj", "task": "t", "start": "2024-01-01T09:00:00+00:00"}
+    nt.STATE_FILE.write_text(json.dumps(legacy))
+
+    state = nt._read_state()
+
+    assert state == nt.SessionState("proj", "t", "2024-01-01T09:00:00+00:00", None)
+    assert nt._read_pending() == []
+
+
+def test_migrates_object_records():
+    active = {
+        "project": "proj",
+        "task": "t",
+        "start": "2024-01-01T09:00:00+00:00",
+        "start_epoch": 1.5,
+    }
+    pending = [
+        {
+            "project": "proj",
+            "task": "queued",
+            "start": "2024-01-01T08:00:00+00:00",
+            "end": "2024-01-01T08:30:00+00:00",
+            "duration_minutes": 30.0,
+        }
+    ]
+    nt.STATE_FILE.write_text(json.dumps({"active": active, "pending": pending}))
+
+    assert nt._read_state() == nt.SessionState.from_dict(active)
+    assert nt._read_pending() == [nt.CompletedEntry.from_dict(pending[0])]
+
+    nt._clear_state()  # the next save writes the array form
+    saved = json.loads(nt.STATE_FILE.read_text())
+    assert saved["active"] is None
+    assert saved["pending"] == [nt.CompletedEntry.from_dict(pending[0]).to_list()]
+
+
+def test_invalid_json_is_reported():
+    nt.STATE_FILE.write_text('{"gen": 1,')
+
+    with pytest.raises(SystemExit, match="malformed"):
+        nt._read_state()
+
+
+def test_cache_sees_in_place_rewrite_within_same_mtime():
+    assert nt._write_state(nt.SessionState("proj", "first", "2024-01-01T09:00:00+00:00"))
+    assert nt._read_state().task == "first"
+    before = nt.STATE_FILE.stat()
+
+    # Another process rewrites the file in place and the mtime doesn't move.
+    store = nt._load_store(fresh=True)
+    store["gen"] += 1
+    store["active"] = nt.SessionState("proj", "second", "2024-01-01T09:00:00+00:00").to_list()
+    fd = os.open(nt.STATE_FILE, os.O_WRONLY)
+    try:
+        os.pwrite(fd, json.dumps(store).encode("utf-8").ljust(nt._STATE_FILE_SIZE), 0)
+    finally:
+        os.close(fd)
+    os.utime(nt.STATE_FILE, ns=(before.st_atime_ns, before.st_mtime_ns))
+    assert nt.STATE_FILE.stat().st_ino == before.st_ino
+
+    assert nt._read_state().task == "second"
+
+
+def test_cache_skips_reread_of_old_file(monkeypatch):
+    assert nt._write_state(nt.SessionState("proj", "t", "2024-01-01T09:00:00+00:00"))
+    old = nt.STATE_FILE.stat().st_mtime_ns - 10 * nt._MTIME_SLACK_NS
+    os.utime(nt.STATE_FILE, ns=(old, old))
+    assert nt._read_state().task == "t"
+
+    def fail():
+        raise AssertionError("state file re-read although it has not changed")
+
+    monkeypatch.setattr(nt, "_read_store_file", fail)
+    assert nt._read_state().task == "t"
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        SystemExit("Network error calling Notion: timed out"),
+        nt.NotionAPIError(401, "Notion API error 401", code="unauthorized"),
+        nt.NotionAPIError(
+            400,
+            "Notion API error 400",
+            code="validation_error",
+            detail="Duration (minutes) is not a property that exists.",
+        ),
+    ],
+)
+def test_queue_survives_failed_flush(monkeypatch, error):
+    _queue("a", "b", "c")
+    calls = []
+
+    def create_notion_page(**kwargs):
+        calls.append(kwargs["task"])
+        if kwargs["task"] == "b":
+            raise error
+
+    monkeypatch.setattr(nt, "create_notion_page", create_notion_page)
+
+    with pytest.raises(SystemExit):
+        nt._flush_pending("token", "db")
+
+    assert calls == ["a", "b"]
+    assert _tasks(nt._read_pending()) == ["b", "c"]
+    assert nt._read_failed() == []
+
+
+def test_rejected_entry_moves_to_failed_and_can_be_requeued(monkeypatch):
+    _queue("a", "bad", "c")
+    rejection = nt.NotionAPIError(
+        400,
+        "Notion API error 400",
+        code="validation_error",
+        detail="Invalid select option, commas not allowed",
+    )
+
+    def create_notion_page(**kwargs):
+        if kwargs["task"] == "bad":
+            raise rejection
+
+    monkeypatch.setattr(nt, "create_notion_page", create_notion_page)
+
+    written, rejected = nt._flush_pending("token", "db")
+
+    assert written == 2
+    assert rejected == [(_entry("bad"), rejection)]
+    assert nt._read_pending() == []
+    assert _tasks(nt._read_failed()) == ["bad"]
+
+    assert nt._requeue_failed() == 1
+    assert _tasks(nt._read_pending()) == ["bad"]
+    assert nt._read_failed() == []